@@ -6,13 +6,29 @@ from django.dispatch import receiver
 from .signals import monkey_patch_queryset
 from .signals import unpatch_queryset
 from .signals import SignalQuerySet
+from .breaker import (
+    CircuitBreaker, circuit_breaker,
+    get_breaker, unregister_breaker, breaker_states
+)
+from .history import (
+    capture_history,
+    register_history, unregister_history
+)
+from .counters import (
+    Counter,
+    register_counter, unregister_counter
+)
 from .signals import (
     pre_create, post_create,
     pre_update, post_update,
     pre_delete, post_delete,
     pre_bulk_create, post_bulk_create,
     pre_get_or_create, post_get_or_create,
-    pre_update_or_create, post_update_or_create
+    pre_update_or_create, post_update_or_create,
+    pre_m2m_add, post_m2m_add,
+    pre_m2m_remove, post_m2m_remove,
+    pre_m2m_clear, post_m2m_clear,
+    pre_m2m_set, post_m2m_set
 )
 
 _ = os.path.abspath(__file__)
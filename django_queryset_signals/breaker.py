@@ -0,0 +1,187 @@
+"""
+Circuit breaking for signal receivers.
+
+Receivers run inline with the queryset method sending the signal, thus a single
+slow or failing receiver delays every write on the sender. Wrapping a receiver
+with circuit_breaker trips it after repeated failures or time budget overruns,
+after which it is skipped (or diverted to a fallback) until it has recovered.
+
+The time budget is only checked once the receiver returns, as receivers cannot
+be interrupted. A receiver that hangs still blocks the write for as long as it
+runs, and so does every trial call after the recovery time.
+"""
+import functools
+import threading
+import time
+import weakref
+
+_clock = getattr(time, 'monotonic', time.time)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Breakers are held by their receivers, and dropped along with them
+_breakers = weakref.WeakValueDictionary()
+
+
+class CircuitBreaker(object):
+    """Tracks the health of a single receiver.
+
+    Args:
+        name: The name the breaker is registered under.
+        time_budget: Seconds a call may take before counting as slow, or None.
+            Measured after the call returned, thus it does not cut calls short.
+        failure_threshold: Consecutive failing calls before tripping.
+        latency_threshold: Consecutive slow calls before tripping.
+        recovery_time: Seconds to stay tripped before a trial call is allowed.
+        fallback: Called with the receiver's arguments instead of the receiver,
+            while tripped, for instance to put the call on a deferred queue.
+    """
+
+    def __init__(self, name, time_budget=None, failure_threshold=5,
+                 latency_threshold=5, recovery_time=30, fallback=None):
+        self.name = name
+        self.time_budget = time_budget
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.recovery_time = recovery_time
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Close the breaker and clear all counters."""
+        with self._lock:
+            self._state = CLOSED
+            self._opened_at = None
+            self._trial_running = False
+            self._consecutive_failures = 0
+            self._consecutive_slow_calls = 0
+            self._calls = 0
+            self._failures = 0
+            self._slow_calls = 0
+            self._skipped = 0
+            self._last_duration = None
+
+    def state(self):
+        """Return a snapshot of the breaker, for monitoring."""
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self._state,
+                'opened_at': self._opened_at,
+                'consecutive_failures': self._consecutive_failures,
+                'consecutive_slow_calls': self._consecutive_slow_calls,
+                'calls': self._calls,
+                'failures': self._failures,
+                'slow_calls': self._slow_calls,
+                'skipped': self._skipped,
+                'last_duration': self._last_duration,
+            }
+
+    def _allow(self):
+        with self._lock:
+            if self._state == OPEN:
+                if _clock() - self._opened_at < self.recovery_time:
+                    self._skipped += 1
+                    return False
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN:
+                # Only a single trial call is let through while recovering
+                if self._trial_running:
+                    self._skipped += 1
+                    return False
+                self._trial_running = True
+            return True
+
+    def _record(self, duration, failed):
+        slow = self.time_budget is not None and duration > self.time_budget
+        with self._lock:
+            self._calls += 1
+            self._last_duration = duration
+            self._trial_running = False
+            if failed:
+                self._failures += 1
+                self._consecutive_failures += 1
+            else:
+                self._consecutive_failures = 0
+            if slow:
+                self._slow_calls += 1
+                self._consecutive_slow_calls += 1
+            else:
+                self._consecutive_slow_calls = 0
+
+            if self._state == HALF_OPEN:
+                trip = failed or slow
+            else:
+                trip = (self._consecutive_failures >= self.failure_threshold or
+                        self._consecutive_slow_calls >= self.latency_threshold)
+            if trip:
+                self._state = OPEN
+                self._opened_at = _clock()
+            elif self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._opened_at = None
+
+    def call(self, func, *args, **kwargs):
+        """Call func through the breaker, or skip it if the breaker is tripped."""
+        if not self._allow():
+            if self.fallback is not None:
+                return self.fallback(*args, **kwargs)
+            return None
+        start = _clock()
+        failed = True
+        try:
+            return_val = func(*args, **kwargs)
+            failed = False
+        finally:
+            # Also records BaseExceptions, such as timeouts, as failures
+            self._record(_clock() - start, failed=failed)
+        return return_val
+
+
+def circuit_breaker(name=None, **options):
+    """Decorate a signal receiver with a circuit breaker.
+
+    Example:
+        >>> @receiver(post_update)
+        >>> @circuit_breaker(time_budget=0.1, recovery_time=60)
+        >>> def callback(sender, queryset, **kwargs):
+        >>>     pass
+
+    Takes the same options as CircuitBreaker, and the breaker is registered
+    under name, which defaults to the dotted path of the receiver. Names must be
+    unique among live breakers, thus receivers made in a factory need a name.
+    """
+    def decorator(func):
+        breaker_name = name or '%s.%s' % (
+            func.__module__, getattr(func, '__qualname__', func.__name__)
+        )
+        if breaker_name in _breakers:
+            raise ValueError('A circuit breaker named %r is already registered, '
+                             'pass a unique name' % breaker_name)
+        breaker = CircuitBreaker(breaker_name, **options)
+        _breakers[breaker_name] = breaker
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return breaker.call(func, *args, **kwargs)
+        wrapper.breaker = breaker
+        return wrapper
+    return decorator
+
+
+def get_breaker(name):
+    """Return the breaker registered under name, while its receiver is alive."""
+    return _breakers[name]
+
+
+def unregister_breaker(name):
+    """Remove the breaker registered under name."""
+    _breakers.pop(name, None)
+
+
+def breaker_states():
+    """Return the state of every registered breaker, keyed by name."""
+    return dict((name, breaker.state()) for name, breaker in list(_breakers.items()))
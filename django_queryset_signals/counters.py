@@ -0,0 +1,252 @@
+"""
+Denormalized counters and aggregates maintained from queryset signals.
+
+A counter field on a parent model, such as Order.line_count, is kept in sync
+with the rows of a child model, such as OrderLine, pointing to it:
+
+    register_counter(OrderLine, 'order', 'line_count')
+    register_counter(OrderLine, 'order', 'total', value_field='amount')
+
+The counters are maintained with deltas computed from the signal payload, and
+applied with a single grouped 'UPDATE ... SET x = x + delta' per operation.
+For updates and deletes the deltas are computed in the pre signal and stored on
+the queryset, and only applied in the post signal, once the write succeeded.
+"""
+from collections import defaultdict
+
+from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save as django_post_save
+
+from .signals import (
+    post_bulk_create,
+    pre_delete, post_delete,
+    pre_update, post_update,
+)
+
+_counters = {}
+
+_UNCHANGED = object()
+
+
+def _is_expression(value):
+    return hasattr(value, 'resolve_expression')
+
+
+class Counter(object):
+    """A counter or sum on a parent model, maintained from a child model.
+
+    Args:
+        model: The child model.
+        parent_field: The name of the foreign key from model to the parent.
+        counter_field: The name of the field on the parent to maintain.
+        value_field: The name of the field on model to sum, or None to count.
+    """
+
+    def __init__(self, model, parent_field, counter_field, value_field=None):
+        self.model = model
+        self.parent_field = model._meta.get_field(parent_field)
+        self.parent_model = self.parent_field.related_model
+        self.target_field = self.parent_field.target_field
+        self.counter_field = self.parent_model._meta.get_field(counter_field)
+        self.value_field = None
+        if value_field is not None:
+            self.value_field = model._meta.get_field(value_field)
+        self.dispatch_uid = _dispatch_uid(model, parent_field, counter_field)
+
+    def _aggregate(self):
+        if self.value_field is None:
+            return Count('pk')
+        return Sum(self.value_field.name)
+
+    def _to_value(self, value):
+        # Raw values, such as strings, are converted before any arithmetic
+        return self.value_field.to_python(value) or 0
+
+    def _value(self, obj):
+        if self.value_field is None:
+            return 1
+        return self._to_value(getattr(obj, self.value_field.attname))
+
+    def _parent_pk(self, value):
+        if isinstance(value, models.Model):
+            value = getattr(value, self.target_field.attname)
+        return self.target_field.to_python(value)
+
+    def _parents(self, parent_pks):
+        return self.parent_model._default_manager.filter(**{
+            self.target_field.name + '__in': list(parent_pks)
+        })
+
+    def apply(self, deltas):
+        """Add deltas, a dict from parent pk to delta, using a single UPDATE."""
+        groups = defaultdict(list)
+        for parent_pk, delta in deltas.items():
+            if parent_pk is not None and delta:
+                groups[delta].append(parent_pk)
+        if not groups:
+            return
+        if len(groups) == 1:
+            delta = list(groups)[0]
+            expression = Value(delta, output_field=self.counter_field)
+        else:
+            # Parents sharing a delta are grouped, thus typically few branches
+            expression = Case(*[
+                When(**{
+                    self.target_field.name + '__in': parent_pks,
+                    'then': Value(delta, output_field=self.counter_field),
+                })
+                for delta, parent_pks in groups.items()
+            ], output_field=self.counter_field)
+        name = self.counter_field.name
+        self._parents(
+            parent_pk for parent_pks in groups.values() for parent_pk in parent_pks
+        ).update(**{name: F(name) + expression})
+
+    def recount(self, parent_pks=None):
+        """Recompute the counter from scratch, for parent_pks or all parents."""
+        children = self.model._default_manager.filter(**{
+            self.parent_field.name: OuterRef(self.target_field.name)
+        }).order_by().values(self.parent_field.name).annotate(
+            _total=self._aggregate()
+        ).values('_total')
+        parents = self.parent_model._default_manager.all()
+        if parent_pks is not None:
+            parents = self._parents(parent_pks)
+        parents.update(**{self.counter_field.name: Coalesce(
+            Subquery(children, output_field=self.counter_field),
+            Value(0, output_field=self.counter_field)
+        )})
+
+    def _post_bulk_create(self, sender, objs, **kwargs):
+        deltas = defaultdict(int)
+        for obj in objs:
+            deltas[self._parent_pk(getattr(obj, self.parent_field.attname))] += self._value(obj)
+        self.apply(deltas)
+
+    def _post_save(self, sender, instance, created, raw=False, **kwargs):
+        # Single row creations, such as create, do not go through bulk_create
+        if created and not raw:
+            self.apply({
+                self._parent_pk(getattr(instance, self.parent_field.attname)): self._value(instance)
+            })
+
+    def _store(self, queryset, attribute, value):
+        if not hasattr(queryset, attribute):
+            setattr(queryset, attribute, {})
+        getattr(queryset, attribute)[self.dispatch_uid] = value
+
+    def _pop(self, queryset, attribute):
+        return getattr(queryset, attribute, {}).pop(self.dispatch_uid, None)
+
+    def _pre_delete(self, sender, queryset, **kwargs):
+        rows = queryset.order_by().values_list(self.parent_field.name).annotate(
+            _total=self._aggregate()
+        )
+        self._store(queryset, '_counter_deltas', dict(
+            (parent_pk, -(total or 0)) for parent_pk, total in rows
+        ))
+
+    def _post_delete(self, sender, queryset, **kwargs):
+        deltas = self._pop(queryset, '_counter_deltas')
+        if deltas is not None:
+            self.apply(deltas)
+
+    def _changed(self, field, kwargs):
+        if field is None:
+            return _UNCHANGED
+        return kwargs.get(field.name, kwargs.get(field.attname, _UNCHANGED))
+
+    def _pre_update(self, sender, queryset, **kwargs):
+        new_parent = self._changed(self.parent_field, kwargs)
+        new_value = self._changed(self.value_field, kwargs)
+        if new_parent is _UNCHANGED and new_value is _UNCHANGED:
+            return
+        if _is_expression(new_parent) or _is_expression(new_value):
+            # The new values are only known after the update, thus the rows
+            # are remembered and their parents recounted in post_update.
+            self._store(queryset, '_counter_rows', list(
+                queryset.values_list('pk', self.parent_field.attname)
+            ))
+            return
+
+        rows = queryset.order_by().values_list(self.parent_field.name).annotate(
+            _count=Count('pk'), _total=self._aggregate()
+        )
+        deltas = defaultdict(int)
+        for parent_pk, count, total in rows:
+            deltas[parent_pk] -= total or 0
+            if new_parent is not _UNCHANGED:
+                parent_pk = self._parent_pk(new_parent)
+            if new_value is not _UNCHANGED:
+                total = count * self._to_value(new_value)
+            deltas[parent_pk] += total or 0
+        self._store(queryset, '_counter_deltas', deltas)
+
+    def _post_update(self, sender, queryset, **kwargs):
+        deltas = self._pop(queryset, '_counter_deltas')
+        if deltas is not None:
+            self.apply(deltas)
+        rows = self._pop(queryset, '_counter_rows')
+        if rows is None:
+            return
+        parent_pks = set(parent_pk for _, parent_pk in rows)
+        parent_pks.update(self.model._default_manager.filter(
+            pk__in=[pk for pk, _ in rows]
+        ).values_list(self.parent_field.attname, flat=True))
+        parent_pks.discard(None)
+        self.recount(parent_pks)
+
+    def connect(self):
+        """Start maintaining the counter."""
+        options = {'sender': self.model, 'weak': False, 'dispatch_uid': self.dispatch_uid}
+        post_bulk_create.connect(self._post_bulk_create, **options)
+        django_post_save.connect(self._post_save, **options)
+        pre_delete.connect(self._pre_delete, **options)
+        post_delete.connect(self._post_delete, **options)
+        pre_update.connect(self._pre_update, **options)
+        post_update.connect(self._post_update, **options)
+
+    def disconnect(self):
+        """Stop maintaining the counter."""
+        options = {'sender': self.model, 'dispatch_uid': self.dispatch_uid}
+        post_bulk_create.disconnect(**options)
+        django_post_save.disconnect(**options)
+        pre_delete.disconnect(**options)
+        post_delete.disconnect(**options)
+        pre_update.disconnect(**options)
+        post_update.disconnect(**options)
+
+
+def _dispatch_uid(model, parent_field, counter_field):
+    return 'django_queryset_signals.counters:%s:%s:%s' % (
+        model._meta.label, parent_field, counter_field
+    )
+
+
+def register_counter(model, parent_field, counter_field, value_field=None):
+    """Maintain counter_field on the parent of model, and return the Counter.
+
+    Takes the same arguments as Counter. Counting is done from bulk_create,
+    single row creation, update and delete. Changing the parent or value of an
+    existing row through save is not tracked, use Counter.recount for those.
+
+    Note:
+        Computing the deltas, the write and the counter UPDATE are separate
+        statements. Unless the write is wrapped in transaction.atomic, a failing
+        counter UPDATE or concurrent writers may leave the counters drifted,
+        until they are repaired with Counter.recount.
+    """
+    unregister_counter(model, parent_field, counter_field)
+    counter = Counter(model, parent_field, counter_field, value_field=value_field)
+    counter.connect()
+    _counters[counter.dispatch_uid] = counter
+    return counter
+
+
+def unregister_counter(model, parent_field, counter_field):
+    """Stop maintaining counter_field on the parent of model."""
+    counter = _counters.pop(_dispatch_uid(model, parent_field, counter_field), None)
+    if counter is not None:
+        counter.disconnect()
@@ -0,0 +1,151 @@
+"""
+Row history capture executed inside the database.
+
+Rows matched by a signalled queryset are copied into a history table using a
+single 'INSERT INTO history (...) SELECT ... FROM table WHERE ...' statement,
+thus the rows never have to be loaded into Python.
+
+The history model must have fields named like the copied fields of the tracked
+model, and its own primary key, for instance:
+
+    class UserHistory(models.Model):
+        history_id = models.AutoField(primary_key=True)
+        id = models.IntegerField()
+        username = models.CharField(max_length=100)
+        history_type = models.CharField(max_length=10)
+        history_date = models.DateTimeField()
+"""
+from django.db import connections, models, router
+from django.db.models.functions import Now
+
+from .signals import pre_update, pre_delete
+
+
+def _field_mapping(model, history_model, fields):
+    """Return a list of (source field name, history field) pairs."""
+    history_opts = history_model._meta
+    if fields is None:
+        history_names = set(
+            field.name for field in history_opts.concrete_fields
+            if field != history_opts.pk
+        )
+        fields = [
+            field.name for field in model._meta.concrete_fields
+            if field.name in history_names
+        ]
+    if not isinstance(fields, dict):
+        fields = dict((name, name) for name in fields)
+    return [
+        (source_name, history_opts.get_field(history_name))
+        for source_name, history_name in sorted(fields.items())
+    ]
+
+
+def capture_history(queryset, history_model, fields=None, type_field=None,
+                    history_type=None, date_field=None):
+    """Copy the rows matched by queryset into history_model.
+
+    Args:
+        queryset: The queryset whose rows are copied.
+        history_model: The model of the history table.
+        fields: The field names to copy, either as a list of names shared by
+            both models, or as a dict mapping source names to history names.
+            Defaults to all fields with matching names, except the history pk.
+        type_field: The history field to store history_type in, if any.
+        history_type: The value stored in type_field, such as 'update'.
+        date_field: The history field to store the current time in, if any.
+
+    Returns:
+        The number of history rows inserted.
+
+    Raises:
+        ValueError: If history_model is written to another database than the
+            queryset, as 'INSERT ... SELECT' cannot span databases.
+    """
+    # The database the write on queryset goes to, see QuerySet.db
+    db = queryset._db or router.db_for_write(queryset.model)
+    if router.db_for_write(history_model) != db:
+        raise ValueError(
+            'History of %s on database %r cannot be captured into %s, which is '
+            'written to another database' % (
+                queryset.model._meta.label, db, history_model._meta.label
+            )
+        )
+    connection = connections[db]
+    quote_name = connection.ops.quote_name
+
+    mapping = _field_mapping(queryset.model, history_model, fields)
+    columns = [history_field.column for _, history_field in mapping]
+
+    # Selecting through a pk subquery, like update and delete do, avoids
+    # duplicate rows from joins over multi-valued relations.
+    queryset = queryset.model._base_manager.using(db).filter(
+        pk__in=queryset.values('pk')
+    )
+    # Annotations are selected after the plain fields, in the order added.
+    annotations = []
+    if type_field is not None:
+        annotations.append((type_field, models.Value(
+            history_type, output_field=models.CharField()
+        )))
+    if date_field is not None:
+        annotations.append((date_field, Now()))
+    for index, (history_name, expression) in enumerate(annotations):
+        queryset = queryset.annotate(**{'_history_%d' % index: expression})
+        columns.append(history_model._meta.get_field(history_name).column)
+
+    queryset = queryset.values_list(*(
+        [source_name for source_name, _ in mapping] +
+        ['_history_%d' % index for index in range(len(annotations))]
+    ))
+    select_sql, params = queryset.query.get_compiler(using=db).as_sql()
+
+    sql = 'INSERT INTO %s (%s) %s' % (
+        quote_name(history_model._meta.db_table),
+        ', '.join(quote_name(column) for column in columns),
+        select_sql,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def _dispatch_uid(model, history_model, action):
+    return 'django_queryset_signals.history:%s:%s:%s' % (
+        model._meta.label, history_model._meta.label, action
+    )
+
+
+def register_history(model, history_model, fields=None, type_field=None,
+                     date_field=None):
+    """Capture history of model into history_model on every update and delete.
+
+    The rows are captured from the pre_update and pre_delete signals, thus
+    before they are changed. Takes the same arguments as capture_history.
+
+    Note:
+        The capture is a statement of its own, run before the update or delete.
+        Unless the write is wrapped in transaction.atomic, a failing write
+        leaves its history rows behind, and concurrent writers may change the
+        rows between the capture and the write.
+    """
+    def _capture_update(sender, queryset, **kwargs):
+        capture_history(queryset, history_model, fields=fields, type_field=type_field,
+                        history_type='update', date_field=date_field)
+
+    def _capture_delete(sender, queryset, **kwargs):
+        capture_history(queryset, history_model, fields=fields, type_field=type_field,
+                        history_type='delete', date_field=date_field)
+
+    pre_update.connect(_capture_update, sender=model, weak=False,
+                       dispatch_uid=_dispatch_uid(model, history_model, 'update'))
+    pre_delete.connect(_capture_delete, sender=model, weak=False,
+                       dispatch_uid=_dispatch_uid(model, history_model, 'delete'))
+
+
+def unregister_history(model, history_model):
+    """Stop capturing history of model into history_model."""
+    pre_update.disconnect(sender=model,
+                          dispatch_uid=_dispatch_uid(model, history_model, 'update'))
+    pre_delete.disconnect(sender=model,
+                          dispatch_uid=_dispatch_uid(model, history_model, 'delete'))
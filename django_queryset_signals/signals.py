@@ -2,6 +2,12 @@
 This module is imported on app ready (see __init__).
 """
 
+import threading
+
+from django.apps import apps
+from django.db import router, transaction
+from django.db.models import deletion
+from django.db.models.fields import related_descriptors
 from django.db.models.query import QuerySet
 from django.dispatch import Signal
 from django.conf import settings
@@ -18,6 +24,8 @@ pre_bulk_create = Signal(providing_args=["queryset", "objs", "batch_size"])
 post_bulk_create = Signal(providing_args=["queryset", "objs", "batch_size"])
 
 def _bulk_create(self, objs, batch_size=None):
+    # Evaluated up front, so an iterator is not spent before the post signal
+    objs = list(objs)
     pre_bulk_create.send(sender=self.model, queryset=self, objs=objs, batch_size=batch_size)
     return_val = getattr(self, 'raw_bulk_create')(objs=objs, batch_size=batch_size)
     post_bulk_create.send(sender=self.model, queryset=self, objs=objs, batch_size=batch_size)
@@ -57,9 +65,35 @@ def _create(self, **kwargs):
 pre_delete = Signal(providing_args=["queryset"])
 post_delete = Signal(providing_args=["queryset"])
 
+_local = threading.local()
+
+def _deleting_querysets():
+    """Querysets currently being deleted by a queryset delete on this thread."""
+    if not hasattr(_local, 'deleting_querysets'):
+        _local.deleting_querysets = []
+    return _local.deleting_querysets
+
+def _deleting_pks(model):
+    """Pks of model covered by the signals of an ongoing queryset delete.
+
+    The pks are fetched on first use, which is during the pre_delete signals
+    of the deletion, thus before any rows have been deleted.
+    """
+    pks = set()
+    for entry in _deleting_querysets():
+        if entry['queryset'].model is model:
+            if entry['pks'] is None:
+                entry['pks'] = set(entry['queryset'].values_list('pk', flat=True))
+            pks.update(entry['pks'])
+    return pks
+
 def _delete(self):
     pre_delete.send(sender=self.model, queryset=self)
-    return_val = getattr(self, 'raw_delete')()
+    _deleting_querysets().append({'queryset': self, 'pks': None})
+    try:
+        return_val = getattr(self, 'raw_delete')()
+    finally:
+        _deleting_querysets().pop()
     post_delete.send(sender=self.model, queryset=self)
     return return_val
 
@@ -80,13 +114,63 @@ from django.db.models.signals import (
     pre_delete as django_pre_delete,
     post_delete as django_post_delete,
 )
+def _deletion_runs():
+    """Model deletions (Collector.delete calls) in progress on this thread."""
+    if not hasattr(_local, 'deletion_runs'):
+        _local.deletion_runs = []
+    return _local.deletion_runs
+
+def _collector_delete(self):
+    _deletion_runs().append({'collector': self, 'relayed': {}})
+    try:
+        return getattr(self, 'raw_delete')()
+    finally:
+        _deletion_runs().pop()
+
+def _relayed_queryset(sender, instance, phase):
+    """Return the queryset to relay the deletion of instance as, or None.
+
+    When monkey patched, all deleted rows of sender within a model deletion are
+    relayed as a single queryset, sent once in each phase, otherwise each row is
+    relayed on its own. Either way the same queryset object is used for both
+    the pre and post signal. The rows of a queryset delete are already covered
+    by its own signals, while rows removed by cascade are relayed.
+    """
+    runs = _deletion_runs()
+    if not runs or sender not in runs[-1]['collector'].data:
+        if instance.pk in _deleting_pks(sender):
+            return None
+        # Django sends the same instance in the pre and post signal
+        if phase == 'pre':
+            instance._queryset_signals_relayed = sender.objects.filter(pk=instance.pk)
+        return getattr(instance, '_queryset_signals_relayed', None)
+    relayed = runs[-1]['relayed']
+    if sender not in relayed:
+        covered = _deleting_pks(sender)
+        pks = [
+            obj.pk for obj in runs[-1]['collector'].data[sender]
+            if obj.pk not in covered
+        ]
+        relayed[sender] = {
+            'queryset': sender.objects.filter(pk__in=pks) if pks else None,
+            'phases': set(),
+        }
+    if phase in relayed[sender]['phases']:
+        return None
+    relayed[sender]['phases'].add(phase)
+    return relayed[sender]['queryset']
+
 @receiver(django_pre_delete)
 def pre_delete_to_qs_pre_delete(sender, instance, *args, **kwargs):
-    pre_delete.send(sender=sender, queryset=sender.objects.filter(pk=instance.pk))
+    queryset = _relayed_queryset(sender, instance, 'pre')
+    if queryset is not None:
+        pre_delete.send(sender=sender, queryset=queryset)
 
 @receiver(django_post_delete)
 def post_delete_to_qs_post_delete(sender, instance, *args, **kwargs):
-    post_delete.send(sender=sender, queryset=sender.objects.filter(pk=instance.pk))
+    queryset = _relayed_queryset(sender, instance, 'post')
+    if queryset is not None:
+        post_delete.send(sender=sender, queryset=queryset)
 
 # Trigger queryset create / update / whatever on model-save
 from django.db.models.signals import (
@@ -120,6 +204,7 @@ class SignalQuerySet(QuerySet):
     # https://docs.djangoproject.com/en/1.11/_modules/django/db/models/query/#QuerySet
 
     def bulk_create(self, objs, batch_size=None):
+        objs = list(objs)
         pre_bulk_create.send(sender=self.model, queryset=self, objs=objs, batch_size=batch_size)
         return_val = super(SignalQuerySet, self).bulk_create(objs=objs, batch_size=batch_size)
         post_bulk_create.send(sender=self.model, queryset=self, objs=objs, batch_size=batch_size)
@@ -139,7 +224,11 @@ class SignalQuerySet(QuerySet):
 
     def delete(self):
         pre_delete.send(sender=self.model, queryset=self)
-        return_val = super(SignalQuerySet, self).delete()
+        _deleting_querysets().append({'queryset': self, 'pks': None})
+        try:
+            return_val = super(SignalQuerySet, self).delete()
+        finally:
+            _deleting_querysets().pop()
         post_delete.send(sender=self.model, queryset=self)
         return return_val
 
@@ -156,6 +245,119 @@ class SignalQuerySet(QuerySet):
         return return_val
 
 
+# Signals for many-to-many related manager writes.
+# The sender is the through model, 'queryset' contains the source instance,
+# 'model' is the target model and 'pk_set' contains all target pks of the call.
+pre_m2m_add = Signal(providing_args=["queryset", "model", "pk_set", "reverse"])
+post_m2m_add = Signal(providing_args=["queryset", "model", "pk_set", "reverse"])
+
+pre_m2m_remove = Signal(providing_args=["queryset", "model", "pk_set", "reverse"])
+post_m2m_remove = Signal(providing_args=["queryset", "model", "pk_set", "reverse"])
+
+pre_m2m_clear = Signal(providing_args=["queryset", "model", "pk_set", "reverse"])
+post_m2m_clear = Signal(providing_args=["queryset", "model", "pk_set", "reverse"])
+
+pre_m2m_set = Signal(providing_args=[
+    "queryset", "model", "pk_set", "added_pk_set", "removed_pk_set", "reverse"
+])
+post_m2m_set = Signal(providing_args=[
+    "queryset", "model", "pk_set", "added_pk_set", "removed_pk_set", "reverse"
+])
+
+
+def _create_forward_many_to_many_manager(superclass, rel, reverse):
+    manager_cls = getattr(related_descriptors, 'raw_create_forward_many_to_many_manager')(
+        superclass, rel, reverse
+    )
+
+    class SignalManyRelatedManager(manager_cls):
+
+        def _m2m_signal_kwargs(self, pk_set):
+            return {
+                'sender': self.through,
+                'queryset': self.instance.__class__._default_manager.filter(pk=self.instance.pk),
+                'model': self.model,
+                'pk_set': pk_set,
+                'reverse': self.reverse,
+            }
+
+        def _target_pk(self, obj):
+            if isinstance(obj, self.model):
+                return self.target_field.get_foreign_related_value(obj)[0]
+            return self.target_field.target_field.to_python(obj)
+
+        def _current_pk_set(self, db):
+            return set(self.using(db).values_list(
+                self.target_field.target_field.attname, flat=True
+            ))
+
+        def add(self, *objs, **kwargs):
+            signal_kwargs = self._m2m_signal_kwargs(set(self._target_pk(obj) for obj in objs))
+            pre_m2m_add.send(**signal_kwargs)
+            return_val = super(SignalManyRelatedManager, self).add(*objs, **kwargs)
+            post_m2m_add.send(**signal_kwargs)
+            return return_val
+        add.alters_data = True
+
+        def remove(self, *objs):
+            signal_kwargs = self._m2m_signal_kwargs(set(self._target_pk(obj) for obj in objs))
+            pre_m2m_remove.send(**signal_kwargs)
+            return_val = super(SignalManyRelatedManager, self).remove(*objs)
+            post_m2m_remove.send(**signal_kwargs)
+            return return_val
+        remove.alters_data = True
+
+        def clear(self):
+            db = router.db_for_write(self.through, instance=self.instance)
+            with transaction.atomic(using=db, savepoint=False):
+                signal_kwargs = self._m2m_signal_kwargs(self._current_pk_set(db))
+                pre_m2m_clear.send(**signal_kwargs)
+                return_val = super(SignalManyRelatedManager, self).clear()
+                post_m2m_clear.send(**signal_kwargs)
+            return return_val
+        clear.alters_data = True
+
+        def set(self, objs, **kwargs):
+            # Mirrors the related manager set(), but computes the diff once and
+            # sends a single set signal instead of separate remove / add signals.
+            clear = kwargs.pop('clear', False)
+            objs = tuple(objs)
+            db = router.db_for_write(self.through, instance=self.instance)
+            with transaction.atomic(using=db, savepoint=False):
+                old_ids = self._current_pk_set(db)
+                new_ids = set(self._target_pk(obj) for obj in objs)
+                signal_kwargs = self._m2m_signal_kwargs(new_ids)
+                if clear:
+                    signal_kwargs['added_pk_set'] = new_ids
+                    signal_kwargs['removed_pk_set'] = old_ids
+                else:
+                    signal_kwargs['added_pk_set'] = new_ids - old_ids
+                    signal_kwargs['removed_pk_set'] = old_ids - new_ids
+                pre_m2m_set.send(**signal_kwargs)
+                if clear:
+                    super(SignalManyRelatedManager, self).clear()
+                    super(SignalManyRelatedManager, self).add(*objs, **kwargs)
+                else:
+                    new_objs = [obj for obj in objs if self._target_pk(obj) not in old_ids]
+                    super(SignalManyRelatedManager, self).remove(*signal_kwargs['removed_pk_set'])
+                    super(SignalManyRelatedManager, self).add(*new_objs, **kwargs)
+                post_m2m_set.send(**signal_kwargs)
+        set.alters_data = True
+
+    return SignalManyRelatedManager
+
+
+def _reset_many_to_many_managers():
+    """Drop cached related manager classes, so they are rebuilt on next access."""
+    # No related manager classes are cached before the models are loaded
+    if not apps.models_ready:
+        return
+    for model in apps.get_models():
+        for attribute in vars(model).values():
+            if isinstance(attribute, related_descriptors.ManyToManyDescriptor):
+                attribute.__dict__.pop('related_manager_cls', None)
+
+
 def monkey_patch_queryset():
     """Monkey patch queryset, thus affecting all querysets."""
     methods = {
@@ -170,6 +372,16 @@ def monkey_patch_queryset():
         if hasattr(QuerySet, 'raw_' + method) == False:
             setattr(QuerySet, 'raw_' + method, getattr(QuerySet, method))
             setattr(QuerySet, method, methods[method])
+    # Relays the rows of a model deletion as one queryset per model
+    if hasattr(deletion.Collector, 'raw_delete') == False:
+        setattr(deletion.Collector, 'raw_delete', deletion.Collector.delete)
+        setattr(deletion.Collector, 'delete', _collector_delete)
+    if hasattr(related_descriptors, 'raw_create_forward_many_to_many_manager') == False:
+        setattr(related_descriptors, 'raw_create_forward_many_to_many_manager',
+                related_descriptors.create_forward_many_to_many_manager)
+        setattr(related_descriptors, 'create_forward_many_to_many_manager',
+                _create_forward_many_to_many_manager)
+        _reset_many_to_many_managers()
 
 
 def unpatch_queryset():
@@ -185,3 +397,15 @@ def unpatch_queryset():
             delattr(QuerySet, 'raw_' + method)
         except AttributeError:
             pass
+    try:
+        setattr(deletion.Collector, 'delete', getattr(deletion.Collector, 'raw_delete'))
+        delattr(deletion.Collector, 'raw_delete')
+    except AttributeError:
+        pass
+    try:
+        setattr(related_descriptors, 'create_forward_many_to_many_manager',
+                getattr(related_descriptors, 'raw_create_forward_many_to_many_manager'))
+        delattr(related_descriptors, 'raw_create_forward_many_to_many_manager')
+        _reset_many_to_many_managers()
+    except AttributeError:
+        pass
@@ -12,3 +12,41 @@ class SignalUser(models.Model):
     # We use these two data fields in our tests
     username = models.CharField(max_length=100, unique=True)
     last_name = models.CharField(max_length=100)
+
+
+class SignalGroup(models.Model):
+    """A model with a many-to-many relation, used for related manager signals."""
+    name = models.CharField(max_length=100)
+    members = models.ManyToManyField(SignalUser, related_name='signal_groups')
+
+
+class SignalUserHistory(models.Model):
+    """History table for SignalUser, used for history capture."""
+    history_id = models.AutoField(primary_key=True)
+    id = models.IntegerField()
+    username = models.CharField(max_length=100)
+    last_name = models.CharField(max_length=100)
+    history_type = models.CharField(max_length=10)
+    history_date = models.DateTimeField(null=True)
+
+
+class SignalOrder(models.Model):
+    """A parent model with denormalized counters, used for counter tests."""
+    objects = SignalQuerySet.as_manager()
+    line_count = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+
+
+class SignalOrderLine(models.Model):
+    """A child model counted on its order, used for counter tests."""
+    objects = SignalQuerySet.as_manager()
+    order = models.ForeignKey(SignalOrder, on_delete=models.CASCADE, related_name='lines')
+    amount = models.IntegerField(default=0)
+
+
+class SignalNode(models.Model):
+    """A self-referential tree, used for cascading delete signals."""
+    objects = SignalQuerySet.as_manager()
+    name = models.CharField(max_length=100)
+    parent = models.ForeignKey('self', null=True, on_delete=models.CASCADE,
+                               related_name='children')
@@ -0,0 +1,208 @@
+"""Tests for circuit breaking of signal receivers."""
+import gc
+
+from django.test import TestCase
+
+from django_queryset_signals import (
+    receiver,
+    unpatch_queryset,
+    post_update,
+    circuit_breaker, get_breaker, unregister_breaker, breaker_states,
+)
+from django_queryset_signals import breaker as breaker_module
+
+from tests.models import SignalUser
+
+
+class Timeout(BaseException):
+    """Imitates timeouts raised as BaseException, such as by gevent."""
+
+
+class FakeClock(object):
+    """A clock which only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# pylint: disable=unused-variable, unused-argument
+class CircuitBreakerTest(TestCase):
+    """Test that misbehaving receivers are tripped and recover."""
+
+    def setUp(self):
+        unpatch_queryset()
+        self.clock = FakeClock()
+        self.original_clock = breaker_module._clock
+        breaker_module._clock = self.clock
+        SignalUser.objects.create(username='test1')
+        self.calls = []
+
+    def tearDown(self):
+        breaker_module._clock = self.original_clock
+
+    def connect(self, func):
+        post_update.connect(func, weak=False)
+        self.addCleanup(post_update.disconnect, func)
+        self.addCleanup(unregister_breaker, func.breaker.name)
+
+    def update_users(self):
+        SignalUser.objects.all().update(last_name='Erone')
+
+    def test_failure_threshold(self):
+        """Test that a failing receiver is tripped, and then skipped."""
+        @circuit_breaker(name='failing', failure_threshold=2, recovery_time=10)
+        def _signal_handler(sender, **kwargs):
+            self.calls.append(sender)
+            raise ValueError()
+        self.connect(_signal_handler)
+
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.update_users()
+        self.assertEqual(get_breaker('failing').state()['state'], 'open')
+        # The receiver is now skipped, thus the write goes through
+        self.update_users()
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(SignalUser.objects.filter(last_name='Erone').count(), 1)
+        self.assertEqual(breaker_states()['failing']['skipped'], 1)
+
+    def test_latency_threshold(self):
+        """Test that a receiver running over its time budget is tripped."""
+        @circuit_breaker(name='slow', time_budget=1, latency_threshold=2)
+        def _signal_handler(sender, **kwargs):
+            self.calls.append(sender)
+            self.clock.now += 2
+        self.connect(_signal_handler)
+
+        for _ in range(3):
+            self.update_users()
+        self.assertEqual(len(self.calls), 2)
+        state = get_breaker('slow').state()
+        self.assertEqual(state['state'], 'open')
+        self.assertEqual(state['slow_calls'], 2)
+        self.assertEqual(state['last_duration'], 2)
+
+    def test_recovery(self):
+        """Test that a tripped receiver recovers after a successful trial."""
+        fail = {'value': True}
+
+        @circuit_breaker(name='recover', failure_threshold=1, recovery_time=10)
+        def _signal_handler(sender, **kwargs):
+            self.calls.append(sender)
+            if fail['value']:
+                raise ValueError()
+        self.connect(_signal_handler)
+
+        with self.assertRaises(ValueError):
+            self.update_users()
+        # Failing trial call trips the breaker again
+        self.clock.now += 10
+        with self.assertRaises(ValueError):
+            self.update_users()
+        self.assertEqual(get_breaker('recover').state()['state'], 'open')
+        # Successful trial call closes the breaker
+        fail['value'] = False
+        self.clock.now += 10
+        self.update_users()
+        self.assertEqual(get_breaker('recover').state()['state'], 'closed')
+        self.update_users()
+        self.assertEqual(len(self.calls), 4)
+
+    def test_fallback(self):
+        """Test that calls are diverted to the fallback while tripped."""
+        deferred = []
+
+        @circuit_breaker(name='fallback', failure_threshold=1,
+                         fallback=lambda **kwargs: deferred.append(kwargs))
+        def _signal_handler(sender, **kwargs):
+            raise ValueError()
+        self.connect(_signal_handler)
+
+        with self.assertRaises(ValueError):
+            self.update_users()
+        self.update_users()
+        self.assertEqual(len(deferred), 1)
+        self.assertEqual(deferred[0]['sender'], SignalUser)
+        self.assertEqual(deferred[0]['last_name'], 'Erone')
+
+    def test_receiver_decorator(self):
+        """Test that the breaker stacks with the receiver decorator."""
+        @receiver(post_update)
+        @circuit_breaker()
+        def _signal_handler(sender, **kwargs):
+            self.calls.append(sender)
+
+        self.addCleanup(unregister_breaker, _signal_handler.breaker.name)
+
+        self.update_users()
+        self.assertEqual(self.calls, [SignalUser])
+        self.assertEqual(_signal_handler.breaker.state()['calls'], 1)
+        self.assertIn(_signal_handler.breaker.name, breaker_states())
+
+    def test_base_exception_trial(self):
+        """Test that a trial call raising a BaseException does not block recovery."""
+        fail = {'value': True}
+
+        @circuit_breaker(name='timeout', failure_threshold=1, recovery_time=10)
+        def _signal_handler(sender, **kwargs):
+            self.calls.append(sender)
+            if fail['value']:
+                raise Timeout()
+        self.connect(_signal_handler)
+
+        with self.assertRaises(Timeout):
+            self.update_users()
+        self.assertEqual(get_breaker('timeout').state()['state'], 'open')
+        self.clock.now += 10
+        with self.assertRaises(Timeout):
+            self.update_users()
+        self.assertEqual(get_breaker('timeout').state()['state'], 'open')
+        # The failed trial call did not leave the breaker waiting for it
+        fail['value'] = False
+        self.clock.now += 10
+        self.update_users()
+        self.assertEqual(get_breaker('timeout').state()['state'], 'closed')
+        self.assertEqual(len(self.calls), 3)
+
+    def test_factory_names(self):
+        """Test that receivers made by a factory must be named."""
+        def make_receiver(name=None):
+            @circuit_breaker(name=name)
+            def _signal_handler(sender, **kwargs):
+                pass
+            return _signal_handler
+
+        first = make_receiver()
+        self.addCleanup(unregister_breaker, first.breaker.name)
+        with self.assertRaises(ValueError):
+            make_receiver()
+        second = make_receiver(name='factory-second')
+        self.addCleanup(unregister_breaker, 'factory-second')
+        self.assertIn(first.breaker.name, breaker_states())
+        self.assertIn(second.breaker.name, breaker_states())
+
+    def test_dropped_receiver(self):
+        """Test that breakers are unregistered along with their receivers."""
+        @circuit_breaker(name='dropped')
+        def _signal_handler(sender, **kwargs):
+            pass
+        self.assertIn('dropped', breaker_states())
+
+        del _signal_handler
+        gc.collect()
+        self.assertNotIn('dropped', breaker_states())
+        # Thus the name can be used again
+        circuit_breaker(name='dropped')(lambda sender, **kwargs: None)
+
+    def test_duplicate_name(self):
+        """Test that explicit names must be unique."""
+        @circuit_breaker(name='duplicate')
+        def _signal_handler(sender, **kwargs):
+            pass
+        self.addCleanup(unregister_breaker, 'duplicate')
+
+        with self.assertRaises(ValueError):
+            circuit_breaker(name='duplicate')(_signal_handler)
@@ -0,0 +1,178 @@
+"""Tests for denormalized counters maintained from queryset signals."""
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from django_queryset_signals import (
+    receiver,
+    monkey_patch_queryset, unpatch_queryset,
+    pre_delete, pre_update,
+    register_counter, unregister_counter,
+)
+
+from tests.models import SignalOrder, SignalOrderLine
+
+
+class CounterTest(TestCase):
+    """Test that counters follow the writes on the counted model."""
+
+    def setUp(self):
+        unpatch_queryset()
+        self.orders = [SignalOrder.objects.create() for _ in range(3)]
+        self.line_count = register_counter(SignalOrderLine, 'order', 'line_count')
+        self.total = register_counter(SignalOrderLine, 'order', 'total', value_field='amount')
+        self.addCleanup(unregister_counter, SignalOrderLine, 'order', 'line_count')
+        self.addCleanup(unregister_counter, SignalOrderLine, 'order', 'total')
+
+    def create_lines(self):
+        SignalOrderLine.objects.bulk_create([
+            SignalOrderLine(order=self.orders[0], amount=10),
+            SignalOrderLine(order=self.orders[0], amount=20),
+            SignalOrderLine(order=self.orders[1], amount=5),
+        ])
+
+    def assertCounters(self, *expected):
+        counters = list(SignalOrder.objects.order_by('pk').values_list('line_count', 'total'))
+        self.assertEqual(counters, list(expected))
+
+    def assertRecountEqual(self):
+        counters = list(SignalOrder.objects.order_by('pk').values_list('line_count', 'total'))
+        self.line_count.recount()
+        self.total.recount()
+        self.assertCounters(*counters)
+
+    def test_bulk_create(self):
+        """Test that bulk_create maintains the counters with one update each."""
+        with CaptureQueriesContext(connection) as context:
+            self.create_lines()
+        updates = [query for query in context.captured_queries
+                   if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertCounters((2, 30), (1, 5), (0, 0))
+        self.assertRecountEqual()
+
+    def test_bulk_create_generator(self):
+        """Test that bulk_create of a generator is counted."""
+        SignalOrderLine.objects.bulk_create(
+            SignalOrderLine(order=self.orders[1], amount=amount) for amount in [1, 2, 3]
+        )
+        self.assertCounters((0, 0), (3, 6), (0, 0))
+
+    def test_create(self):
+        """Test that single row creations are counted."""
+        SignalOrderLine.objects.create(order=self.orders[2], amount=7)
+        self.assertCounters((0, 0), (0, 0), (1, 7))
+
+    def test_delete(self):
+        """Test that queryset deletes are subtracted."""
+        self.create_lines()
+        SignalOrderLine.objects.filter(amount__gte=10).delete()
+        self.assertCounters((0, 0), (1, 5), (0, 0))
+        self.assertRecountEqual()
+
+    def test_instance_delete(self):
+        """Test that model deletes are subtracted."""
+        self.create_lines()
+        SignalOrderLine.objects.get(amount=5).delete()
+        self.assertCounters((2, 30), (0, 0), (0, 0))
+
+    def test_update_parent(self):
+        """Test that moving rows between parents moves their counts."""
+        self.create_lines()
+        SignalOrderLine.objects.filter(amount__lte=10).update(order=self.orders[2])
+        self.assertCounters((1, 20), (0, 0), (2, 15))
+        self.assertRecountEqual()
+
+    def test_update_value(self):
+        """Test that changing the summed value changes the sums."""
+        self.create_lines()
+        SignalOrderLine.objects.filter(order=self.orders[0]).update(amount=1)
+        self.assertCounters((2, 2), (1, 5), (0, 0))
+
+    def test_raw_values(self):
+        """Test that raw values, such as strings, are converted."""
+        SignalOrderLine.objects.bulk_create([
+            SignalOrderLine(order_id=str(self.orders[0].pk), amount='3'),
+            SignalOrderLine(order_id=self.orders[0].pk, amount=4),
+        ])
+        self.assertCounters((2, 7), (0, 0), (0, 0))
+        SignalOrderLine.objects.all().update(amount='5', order=str(self.orders[1].pk))
+        self.assertCounters((0, 0), (2, 10), (0, 0))
+        self.assertRecountEqual()
+
+    def test_update_expression(self):
+        """Test that updates with expressions recount the affected parents."""
+        self.create_lines()
+        SignalOrderLine.objects.filter(order=self.orders[0]).update(amount=F('amount') * 2)
+        self.assertCounters((2, 60), (1, 5), (0, 0))
+
+    def test_unrelated_update(self):
+        """Test that updates of other fields do not touch the counters."""
+        self.create_lines()
+        with CaptureQueriesContext(connection) as context:
+            SignalOrderLine.objects.all().update(id=F('id'))
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_recount(self):
+        """Test that recount repairs counters which have drifted."""
+        self.create_lines()
+        SignalOrder.objects.all().update(line_count=100, total=100)
+        self.line_count.recount([self.orders[0].pk])
+        self.assertCounters((2, 100), (100, 100), (100, 100))
+
+    def veto(self, signal):
+        @receiver(signal, sender=SignalOrderLine, weak=False)
+        def _signal_handler(sender, **kwargs):
+            raise ValueError()
+        self.addCleanup(signal.disconnect, _signal_handler, sender=SignalOrderLine)
+
+    def test_failed_delete(self):
+        """Test that counters are unchanged when the delete fails."""
+        self.create_lines()
+        self.veto(pre_delete)
+        with self.assertRaises(ValueError), transaction.atomic():
+            SignalOrderLine.objects.filter(order=self.orders[0]).delete()
+        with self.assertRaises(ValueError), transaction.atomic():
+            SignalOrderLine.objects.get(amount=5).delete()
+        self.assertEqual(SignalOrderLine.objects.count(), 3)
+        self.assertCounters((2, 30), (1, 5), (0, 0))
+
+    def test_failed_update(self):
+        """Test that counters are unchanged when the update fails."""
+        self.create_lines()
+        self.veto(pre_update)
+        with self.assertRaises(ValueError), transaction.atomic():
+            SignalOrderLine.objects.all().update(order=self.orders[2])
+        self.assertCounters((2, 30), (1, 5), (0, 0))
+
+    def delete_order_queries(self, lines, delete):
+        order = SignalOrder.objects.create()
+        SignalOrderLine.objects.bulk_create([
+            SignalOrderLine(order=order, amount=1) for _ in range(lines)
+        ])
+        # Batching the relayed deletes requires monkey patching
+        monkey_patch_queryset()
+        self.addCleanup(unpatch_queryset)
+        with CaptureQueriesContext(connection) as context:
+            delete(order)
+        unpatch_queryset()
+        self.assertFalse(SignalOrderLine.objects.filter(order_id=order.pk).exists())
+        return len(context.captured_queries)
+
+    def test_cascade_queries(self):
+        """Test that cascading deletes maintain counters per batch, not per row."""
+        for delete in [
+                lambda order: order.delete(),
+                lambda order: SignalOrder.objects.filter(pk=order.pk).delete()]:
+            self.assertEqual(
+                self.delete_order_queries(5, delete),
+                self.delete_order_queries(50, delete)
+            )
+        self.assertLessEqual(self.delete_order_queries(50, lambda order: order.delete()), 10)
+
+    def test_unregister(self):
+        """Test that counters are no longer maintained once unregistered."""
+        unregister_counter(SignalOrderLine, 'order', 'line_count')
+        self.create_lines()
+        self.assertCounters((0, 30), (0, 5), (0, 0))
@@ -0,0 +1,97 @@
+"""Tests for history capture executed inside the database."""
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from django_queryset_signals import (
+    unpatch_queryset,
+    capture_history, register_history, unregister_history,
+)
+
+from tests.models import SignalUser, SignalUserHistory, SignalGroup
+
+
+class HistoryTest(TestCase):
+    """Test that rows are copied into the history table before writes."""
+
+    def setUp(self):
+        unpatch_queryset()
+        SignalUser.objects.bulk_create([
+            SignalUser(username='test1', last_name='One'),
+            SignalUser(username='test2', last_name='Two'),
+            SignalUser(username='test3', last_name='Three'),
+        ])
+        register_history(SignalUser, SignalUserHistory,
+                         type_field='history_type', date_field='history_date')
+        self.addCleanup(unregister_history, SignalUser, SignalUserHistory)
+
+    def history(self):
+        return list(SignalUserHistory.objects.order_by('history_id').values_list(
+            'id', 'username', 'last_name', 'history_type'
+        ))
+
+    def test_capture_update(self):
+        """Test that the old rows are captured on update."""
+        user = SignalUser.objects.get(username='test1')
+        SignalUser.objects.filter(username='test1').update(last_name='Erone')
+        self.assertEqual(self.history(), [(user.pk, 'test1', 'One', 'update')])
+        self.assertFalse(SignalUserHistory.objects.filter(history_date=None).exists())
+
+    def test_capture_delete(self):
+        """Test that the rows are captured on queryset delete."""
+        SignalUser.objects.exclude(username='test1').delete()
+        self.assertEqual(
+            sorted(row[1:] for row in self.history()),
+            [('test2', 'Two', 'delete'), ('test3', 'Three', 'delete')]
+        )
+
+    def test_capture_instance_delete(self):
+        """Test that the row is captured on model delete."""
+        user = SignalUser.objects.get(username='test2')
+        pk = user.pk
+        user.delete()
+        self.assertEqual(self.history(), [(pk, 'test2', 'Two', 'delete')])
+
+    def test_single_statement(self):
+        """Test that history is captured with a single statement."""
+        with CaptureQueriesContext(connection) as context:
+            SignalUser.objects.all().update(last_name='Erone')
+        self.assertEqual(len(context.captured_queries), 2)
+        self.assertTrue(context.captured_queries[0]['sql'].startswith('INSERT INTO'))
+        self.assertEqual(SignalUserHistory.objects.count(), 3)
+
+    def test_join(self):
+        """Test that filters over multi-valued relations capture each row once."""
+        user = SignalUser.objects.get(username='test1')
+        for name in ['g1', 'g2', 'g3']:
+            SignalGroup.objects.create(name=name).members.add(user)
+        updated = SignalUser.objects.filter(
+            signal_groups__name__startswith='g'
+        ).update(last_name='Erone')
+        self.assertEqual(updated, 1)
+        self.assertEqual(self.history(), [(user.pk, 'test1', 'One', 'update')])
+
+    def test_other_database(self):
+        """Test that history cannot be captured across databases."""
+        with self.assertRaises(ValueError):
+            capture_history(SignalUser.objects.using('other'), SignalUserHistory)
+
+    def test_unregister(self):
+        """Test that history is no longer captured once unregistered."""
+        unregister_history(SignalUser, SignalUserHistory)
+        SignalUser.objects.all().update(last_name='Erone')
+        self.assertEqual(self.history(), [])
+
+    def test_fields(self):
+        """Test that only the given fields are copied."""
+        unregister_history(SignalUser, SignalUserHistory)
+        rows = capture_history(
+            SignalUser.objects.filter(username='test3'), SignalUserHistory,
+            fields={'id': 'id', 'username': 'last_name', 'last_name': 'username'},
+            type_field='history_type', history_type='manual',
+        )
+        self.assertEqual(rows, 1)
+        self.assertEqual(self.history(), [
+            (SignalUser.objects.get(username='test3').pk, 'Three', 'test3', 'manual')
+        ])
+
@@ -3,7 +3,9 @@ from django.test import (
     TestCase,
     override_settings
 )
+from django.apps import apps
 from django.contrib.auth.models import User
+from django.db.models.deletion import Collector
 from django.db.models.query import QuerySet
 from django.db.models.signals import (
     pre_save, post_save,
@@ -20,11 +22,14 @@ from django_queryset_signals import (
     pre_get_or_create, post_get_or_create,
     pre_update_or_create, post_update_or_create,
     pre_update, post_update,
+    pre_m2m_add, post_m2m_add,
+    pre_m2m_remove, post_m2m_remove,
+    pre_m2m_clear, post_m2m_clear,
+    pre_m2m_set, post_m2m_set,
 )
 # TODO: Consider pre_init / post_init
-# TODO: Consider m2m_changed
 
-from tests.models import SignalUser
+from tests.models import SignalUser, SignalGroup, SignalNode
 
 from parameterized import parameterized, parameterized_class
 
@@ -49,6 +54,15 @@ class TestMonkeyPatching(TestCase):
         # Patched and non-patched should be different
         self.assertNotEqual(pre_monkey_method, pre_normal_method)
 
+    def test_monkey_collector(self):
+        """Test that the deletion collector is patched and unpatched."""
+        unpatch_queryset()
+        normal_method = Collector.delete
+        monkey_patch_queryset()
+        self.assertNotEqual(Collector.delete, normal_method)
+        unpatch_queryset()
+        self.assertEqual(Collector.delete, normal_method)
+
 
 # pylint: disable=unused-variable, unused-argument
 @parameterized_class([
@@ -241,3 +255,193 @@ class QuerysetSignalsTest(TestCase):
         self.assertEqual(self.model.objects.filter(last_name="John").count(), 1)
         self.assertEqual(self.model.objects.filter(username="test1").count(), 0)
         self.assertEqual(self.model.objects.filter(username="test3").count(), 1)
+
+
+class CascadeDeleteSignalsTest(TestCase):
+    """Test that rows removed by cascade get relayed delete signals."""
+
+    def setUp(self):
+        unpatch_queryset()
+        root = SignalNode.objects.create(name='root')
+        child = SignalNode.objects.create(name='child', parent=root)
+        SignalNode.objects.create(name='grandchild', parent=child)
+        SignalNode.objects.create(name='other')
+
+    def deleted_names(self, signal):
+        names = []
+
+        @receiver(signal, sender=SignalNode, weak=False)
+        def _signal_handler(sender, queryset, **kwargs):
+            names.append(sorted(queryset.values_list('name', flat=True)))
+        self.addCleanup(signal.disconnect, _signal_handler, sender=SignalNode)
+        return names
+
+    @parameterized.expand([
+        [lambda: SignalNode.objects.filter(name='root').delete()],
+        [lambda: SignalNode.objects.get(name='root').delete()],
+    ])
+    def test_self_cascade(self, delete):
+        names = self.deleted_names(qs_pre_delete)
+        delete()
+        self.assertEqual(
+            sorted(name for queryset_names in names for name in queryset_names),
+            ['child', 'grandchild', 'root']
+        )
+        self.assertEqual(list(SignalNode.objects.values_list('name', flat=True)), ['other'])
+
+    def relayed_querysets(self, delete):
+        calls = {'pre': [], 'post': []}
+
+        @receiver(qs_pre_delete, sender=SignalNode, weak=False)
+        def _pre_handler(sender, queryset, **kwargs):
+            calls['pre'].append(queryset)
+
+        @receiver(qs_post_delete, sender=SignalNode, weak=False)
+        def _post_handler(sender, queryset, **kwargs):
+            calls['post'].append(queryset)
+        self.addCleanup(qs_pre_delete.disconnect, _pre_handler, sender=SignalNode)
+        self.addCleanup(qs_post_delete.disconnect, _post_handler, sender=SignalNode)
+
+        delete()
+        # The same queryset objects are sent in the pre and post signals
+        self.assertEqual(
+            set(id(queryset) for queryset in calls['pre']),
+            set(id(queryset) for queryset in calls['post'])
+        )
+        return calls['post']
+
+    def test_post_self_cascade(self):
+        querysets = self.relayed_querysets(
+            lambda: SignalNode.objects.filter(name='root').delete()
+        )
+        # The queryset itself, and each cascaded row
+        self.assertEqual(len(querysets), 3)
+
+    def test_patched_self_cascade(self):
+        """Test that a patched model delete relays its rows as one queryset."""
+        monkey_patch_queryset()
+        self.addCleanup(unpatch_queryset)
+        querysets = self.relayed_querysets(
+            lambda: SignalNode.objects.get(name='root').delete()
+        )
+        self.assertEqual(len(querysets), 1)
+
+
+class ManyToManySignalsTest(TestCase):
+    """Test that related manager writes send a single signal per call."""
+
+    def setUp(self):
+        monkey_patch_queryset()
+        self.group = SignalGroup.objects.create(name='group')
+        self.users = [
+            SignalUser.objects.create(username='test' + str(index))
+            for index in range(3)
+        ]
+        self.calls = []
+
+    def tearDown(self):
+        unpatch_queryset()
+
+    def connect(self, signal):
+        @receiver(signal, weak=False)
+        def _signal_handler(sender, **kwargs):
+            self.calls.append((sender, kwargs))
+        self.addCleanup(signal.disconnect, _signal_handler)
+
+    def user_pks(self, *indexes):
+        return set(self.users[index].pk for index in indexes)
+
+    @parameterized.expand([
+        [pre_m2m_add], [post_m2m_add],
+    ])
+    def test_add(self, signal):
+        self.connect(signal)
+        self.group.members.add(self.users[0], self.users[1].pk)
+        self.assertEqual(len(self.calls), 1)
+        sender, kwargs = self.calls[0]
+        self.assertEqual(sender, SignalGroup.members.through)
+        self.assertEqual(kwargs['model'], SignalUser)
+        self.assertEqual(kwargs['pk_set'], self.user_pks(0, 1))
+        self.assertEqual(list(kwargs['queryset']), [self.group])
+        self.assertFalse(kwargs['reverse'])
+
+    @parameterized.expand([
+        [pre_m2m_remove], [post_m2m_remove],
+    ])
+    def test_remove(self, signal):
+        self.group.members.add(*self.users)
+        self.connect(signal)
+        self.group.members.remove(self.users[0], self.users[2])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.calls[0][1]['pk_set'], self.user_pks(0, 2))
+
+    @parameterized.expand([
+        [pre_m2m_clear], [post_m2m_clear],
+    ])
+    def test_clear(self, signal):
+        self.group.members.add(*self.users)
+        self.connect(signal)
+        self.group.members.clear()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.calls[0][1]['pk_set'], self.user_pks(0, 1, 2))
+
+    def test_reverse(self):
+        self.connect(pre_m2m_add)
+        self.users[0].signal_groups.add(self.group)
+        sender, kwargs = self.calls[0]
+        self.assertEqual(kwargs['model'], SignalGroup)
+        self.assertEqual(kwargs['pk_set'], set([self.group.pk]))
+        self.assertEqual(list(kwargs['queryset']), [self.users[0]])
+        self.assertTrue(kwargs['reverse'])
+
+    def test_set(self):
+        self.group.members.add(self.users[0], self.users[1])
+        for signal in [pre_m2m_set, pre_m2m_add, pre_m2m_remove]:
+            self.connect(signal)
+        self.group.members.set([self.users[1], self.users[2]])
+        # Only the set signal is sent
+        self.assertEqual(len(self.calls), 1)
+        kwargs = self.calls[0][1]
+        self.assertEqual(kwargs['pk_set'], self.user_pks(1, 2))
+        self.assertEqual(kwargs['added_pk_set'], self.user_pks(2))
+        self.assertEqual(kwargs['removed_pk_set'], self.user_pks(0))
+        self.assertEqual(set(self.group.members.values_list('pk', flat=True)),
+                         self.user_pks(1, 2))
+
+    def test_set_raw_pks(self):
+        """Test that raw pk values are prepped, like the related manager does."""
+        self.group.members.add(self.users[0])
+        self.connect(pre_m2m_set)
+        self.group.members.set([str(self.users[0].pk), str(self.users[1].pk)])
+        kwargs = self.calls[0][1]
+        self.assertEqual(kwargs['pk_set'], self.user_pks(0, 1))
+        self.assertEqual(kwargs['added_pk_set'], self.user_pks(1))
+        self.assertEqual(kwargs['removed_pk_set'], set())
+
+    def test_set_clear(self):
+        self.group.members.add(self.users[0], self.users[1])
+        self.connect(post_m2m_set)
+        self.group.members.set([self.users[1]], clear=True)
+        kwargs = self.calls[0][1]
+        self.assertEqual(kwargs['added_pk_set'], self.user_pks(1))
+        self.assertEqual(kwargs['removed_pk_set'], self.user_pks(0, 1))
+        self.assertEqual(set(self.group.members.values_list('pk', flat=True)),
+                         self.user_pks(1))
+
+    def test_patch_before_models_ready(self):
+        """Test that patching works before the app registry is ready."""
+        unpatch_queryset()
+        apps.models_ready = False
+        try:
+            monkey_patch_queryset()
+        finally:
+            apps.models_ready = True
+        self.connect(pre_m2m_add)
+        self.group.members.add(self.users[0])
+        self.assertEqual(len(self.calls), 1)
+
+    def test_unpatched(self):
+        unpatch_queryset()
+        self.connect(pre_m2m_add)
+        self.group.members.add(self.users[0])
+        self.assertEqual(self.calls, [])